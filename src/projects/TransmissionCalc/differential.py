@@ -0,0 +1,463 @@
+"""
+Differential test harness for solver engines.
+
+Holds a frozen copy of the original pure-Python scoring and search code as a
+reference oracle. Any engine with the find_best_configurations signature can
+be checked against it; the first diverging setup is reported together with
+the oracle's score breakdown for both setups.
+
+Run `python differential.py [max_gearboxes] [random_cases] [seed]` to check
+the engines in solver.py.
+"""
+import contextlib
+import itertools
+import math
+import random
+import sys
+
+import solver
+
+# Frozen copies of the data the oracle was written against. Do not update
+# these when solver.py changes; the point is to catch such changes.
+REFERENCE_RATIO_MAP = {
+    "1:1": 1.0,
+    "6:5": 1.2,
+    "3:2": 1.5,
+    "9:5": 1.8,
+    "2:1": 2.0,
+    "5:2": 2.5,
+    "3:1": 3.0,
+}
+
+REFERENCE_STRATEGIES = {
+    "Balanced": {
+        "range": 5.0,
+        "smoothness": 0.5,
+        "utilization": 10.0,
+        "filter_max": False,
+    },
+    "Range First": {
+        "range": 10.0,
+        "smoothness": 0.1,
+        "utilization": 0.5,
+        "filter_max": False,
+    },
+    "Smoothness First": {
+        "range": 2.0,
+        "smoothness": 5.0,
+        "utilization": 0.5,
+        "filter_max": False,
+    },
+    "Quality Over Quantity": {
+        "range": 10.0,
+        "smoothness": 10.0,
+        "utilization": 0.5,
+        "filter_max": False,
+    },
+}
+
+# A low-utilization strategy with the Max Gears Only rule, added to both
+# strategy tables while the suite runs so the filter_max branch is compared
+# too (no shipped strategy enables it). It has to be a strategy whose top-N
+# actually changes under the filter; Balanced's utilization weight already
+# keeps short setups out. filter_max_coverage() guards this.
+FILTER_MAX_BASE = "Range First"
+FILTER_MAX_STRATEGY = "Range First (Max Gears Only)"
+
+# Fixed targets checked exhaustively for every gearbox count
+FIXED_TARGETS = [
+    (0.5, 3.0),
+    (0.2, 5.0),
+    (1.0, 1.0),
+    (0.1, 10.0),
+    (1.5, 2.5),
+]
+
+SCORE_REL_TOL = 1e-9
+SCORE_ABS_TOL = 1e-9
+
+
+def setup_signature(setup):
+    """Engine-independent identity of a setup: tuple of (orientation, A, B)."""
+    return tuple((gb.orientation, gb.ratio_a_name, gb.ratio_b_name) for gb in setup)
+
+
+def reference_options():
+    """All single gearbox signatures, in the original enumeration order."""
+    options = []
+    for r1, r2 in itertools.combinations(list(REFERENCE_RATIO_MAP.keys()), 2):
+        options.append((1, r1, r2))
+        options.append((-1, r1, r2))
+    return options
+
+
+def reference_ratios(signature):
+    """Sorted unique transmission ratios of a setup signature."""
+    gb_values = []
+    for orientation, name_a, name_b in signature:
+        val_a = REFERENCE_RATIO_MAP[name_a]
+        val_b = REFERENCE_RATIO_MAP[name_b]
+        if orientation == 1:
+            gb_values.append((val_a, val_b))
+        else:
+            gb_values.append((1.0 / val_a, 1.0 / val_b))
+
+    unique = set()
+    for combination in itertools.product(*gb_values):
+        total_ratio = 1.0
+        for val in combination:
+            total_ratio *= val
+        unique.add(total_ratio)
+    return sorted(list(unique))
+
+
+def reference_main_sequence(ratios):
+    """Original 2% threshold filter."""
+    main_seq = []
+    last_r = -1.0
+    for r in ratios:
+        if last_r < 0 or r > last_r * 1.02:
+            main_seq.append(r)
+            last_r = r
+    return main_seq
+
+
+def reference_score_breakdown(signature, target_min, target_max, strategy):
+    """
+    Scores a setup signature with the original objective.
+    Returns a dict with every term and the total.
+    """
+    return breakdown_from_ratios(
+        reference_ratios(signature), len(signature), target_min, target_max, strategy
+    )
+
+
+def breakdown_from_ratios(ratios, num_gearboxes, target_min, target_max, strategy):
+    """
+    Original objective applied to a given list of sorted unique ratios.
+    Used directly to break down the ratios an engine returned.
+    """
+    weights = REFERENCE_STRATEGIES[strategy]
+    main_ratios = reference_main_sequence(ratios)
+
+    actual_min = ratios[0]
+    actual_max = ratios[-1]
+
+    min_error = abs(actual_min - target_min) / target_min
+    max_error = abs(actual_max - target_max) / target_max
+    range_score = ((min_error * 100) + (max_error * 100)) * weights["range"]
+
+    std_dev = None
+    if len(main_ratios) > 1:
+        log_ratios = [math.log(r) for r in main_ratios]
+        gaps = [log_ratios[i + 1] - log_ratios[i]
+                for i in range(len(log_ratios) - 1)]
+
+        avg_gap = sum(gaps) / len(gaps)
+        variance = sum((g - avg_gap) ** 2 for g in gaps) / len(gaps)
+        std_dev = math.sqrt(variance)
+
+        raw_smoothness_score = std_dev * 1000
+
+        max_possible_gears = 2 ** num_gearboxes
+        utilization = len(main_ratios) / max_possible_gears
+        raw_util_penalty = (1.0 - utilization) * 500.0
+
+        smoothness_score = (raw_smoothness_score + raw_util_penalty) * weights[
+            "smoothness"
+        ]
+        utilization_score = raw_util_penalty * weights["utilization"]
+    else:
+        smoothness_score = 500.0 * weights["smoothness"]
+        utilization_score = 500.0 * weights["utilization"]
+
+    return {
+        "score": range_score + smoothness_score + utilization_score,
+        "range": range_score,
+        "smoothness": smoothness_score,
+        "utilization": utilization_score,
+        "actual_min": actual_min,
+        "actual_max": actual_max,
+        "unique_ratios": len(ratios),
+        "main_sequence": len(main_ratios),
+        "log_gap_std_dev": std_dev,
+        "ratios": ratios,
+    }
+
+
+def reference_find_best_configurations(
+    num_gearboxes, target_min, target_max, top_n=5, strategy="Balanced"
+):
+    """
+    Original exhaustive search. Returns a list of dicts with 'score' and
+    'setup' (a signature, not GearboxConfig objects).
+    """
+    strategy_config = REFERENCE_STRATEGIES[strategy]
+    best_results = []
+
+    for signature in itertools.combinations_with_replacement(
+        reference_options(), num_gearboxes
+    ):
+        breakdown = reference_score_breakdown(
+            signature, target_min, target_max, strategy
+        )
+        if strategy_config["filter_max"]:
+            if breakdown["unique_ratios"] < (2**num_gearboxes):
+                continue
+        best_results.append({"score": breakdown["score"], "setup": signature})
+
+    best_results.sort(key=lambda x: x["score"])
+
+    unique_results = []
+    seen_scores = set()
+    for res in best_results:
+        rounded_score = round(res["score"], 4)
+        if rounded_score not in seen_scores:
+            seen_scores.add(rounded_score)
+            unique_results.append(res)
+            if len(unique_results) >= top_n:
+                break
+
+    return unique_results
+
+
+def scores_match(a, b):
+    return math.isclose(a, b, rel_tol=SCORE_REL_TOL, abs_tol=SCORE_ABS_TOL)
+
+
+def compare_engine(
+    engine, num_gearboxes, target_min, target_max, top_n=5, strategy="Balanced"
+):
+    """
+    Runs engine and the oracle on one case.
+    Returns None if the rankings agree, otherwise a divergence dict describing
+    the first differing position.
+    """
+    expected = reference_find_best_configurations(
+        num_gearboxes, target_min, target_max, top_n, strategy
+    )
+    actual = engine(num_gearboxes, target_min, target_max, top_n, strategy)
+
+    for idx in range(max(len(expected), len(actual))):
+        exp = expected[idx] if idx < len(expected) else None
+        act = actual[idx] if idx < len(actual) else None
+        act_sig = setup_signature(act["setup"]) if act else None
+
+        if exp and act and exp["setup"] == act_sig and scores_match(
+            exp["score"], act["score"]
+        ):
+            continue
+
+        divergence = {
+            "strategy": strategy,
+            "gearboxes": num_gearboxes,
+            "target_min": target_min,
+            "target_max": target_max,
+            "rank": idx + 1,
+            "reference": None,
+            "engine": None,
+        }
+        if exp:
+            divergence["reference"] = {
+                "setup": exp["setup"],
+                "breakdown": reference_score_breakdown(
+                    exp["setup"], target_min, target_max, strategy
+                ),
+            }
+        if act:
+            divergence["engine"] = {
+                "setup": act_sig,
+                "reported_score": act["score"],
+                "breakdown": reference_score_breakdown(
+                    act_sig, target_min, target_max, strategy
+                ),
+            }
+        return divergence
+
+    return None
+
+
+def compare_score_function(score_fn, num_gearboxes, target_min, target_max, strategy):
+    """
+    Checks score_fn (score_configuration signature) against the oracle on
+    every setup of the given size. Returns the first divergence or None.
+    """
+    for gear_setup in itertools.combinations_with_replacement(
+        solver.generate_gearbox_options(), num_gearboxes
+    ):
+        signature = setup_signature(gear_setup)
+        expected = reference_score_breakdown(
+            signature, target_min, target_max, strategy
+        )
+        score, ratios = score_fn(gear_setup, target_min, target_max, strategy)
+
+        if not scores_match(expected["score"], score) or len(ratios) != len(
+            expected["ratios"]
+        ):
+            return {
+                "strategy": strategy,
+                "gearboxes": num_gearboxes,
+                "target_min": target_min,
+                "target_max": target_max,
+                "rank": None,
+                "reference": {"setup": signature, "breakdown": expected},
+                "engine": {
+                    "setup": signature,
+                    "reported_score": score,
+                    # Oracle terms on the engine's own ratios
+                    "breakdown": breakdown_from_ratios(
+                        ratios, num_gearboxes, target_min, target_max, strategy
+                    ),
+                },
+            }
+    return None
+
+
+def generate_cases(max_gearboxes=3, random_cases=20, seed=0):
+    """
+    Exhaustive fixed-target cases for 1..max_gearboxes plus seeded random
+    (log-uniform) targets. Yields (num_gearboxes, target_min, target_max).
+    """
+    for num in range(1, max_gearboxes + 1):
+        for target_min, target_max in FIXED_TARGETS:
+            yield num, target_min, target_max
+
+    rng = random.Random(seed)
+    for _ in range(random_cases):
+        num = rng.randint(1, max_gearboxes)
+        a = math.exp(rng.uniform(math.log(0.05), math.log(20.0)))
+        b = math.exp(rng.uniform(math.log(0.05), math.log(20.0)))
+        yield num, round(min(a, b), 3), round(max(a, b), 3)
+
+
+@contextlib.contextmanager
+def filter_max_variant():
+    """Temporarily adds FILTER_MAX_STRATEGY to both strategy tables."""
+    REFERENCE_STRATEGIES[FILTER_MAX_STRATEGY] = dict(
+        REFERENCE_STRATEGIES[FILTER_MAX_BASE], filter_max=True
+    )
+    solver.STRATEGIES[FILTER_MAX_STRATEGY] = dict(
+        solver.STRATEGIES[FILTER_MAX_BASE], filter_max=True
+    )
+    try:
+        yield
+    finally:
+        del REFERENCE_STRATEGIES[FILTER_MAX_STRATEGY]
+        del solver.STRATEGIES[FILTER_MAX_STRATEGY]
+
+
+def filter_max_coverage(max_gearboxes=3, top_n=5):
+    """
+    Number of fixed cases where the oracle's FILTER_MAX_STRATEGY top_n
+    differs from FILTER_MAX_BASE's. Zero means the suite no longer exercises
+    the filter_max rule.
+    """
+    differing = 0
+    with filter_max_variant():
+        for num in range(1, max_gearboxes + 1):
+            for target_min, target_max in FIXED_TARGETS:
+                filtered = reference_find_best_configurations(
+                    num, target_min, target_max, top_n, FILTER_MAX_STRATEGY
+                )
+                unfiltered = reference_find_best_configurations(
+                    num, target_min, target_max, top_n, FILTER_MAX_BASE
+                )
+                if [r["setup"] for r in filtered] != [r["setup"] for r in unfiltered]:
+                    differing += 1
+    return differing
+
+
+def run_differential_suite(engines, max_gearboxes=3, random_cases=20, seed=0, top_n=5):
+    """
+    Runs every engine (name -> callable) on every case and strategy shared
+    with the oracle, plus FILTER_MAX_STRATEGY. Returns a list of
+    (engine_name, divergence).
+    """
+    failures = []
+
+    with filter_max_variant():
+        strategies = [s for s in REFERENCE_STRATEGIES if s in solver.STRATEGIES]
+        for num, target_min, target_max in generate_cases(
+            max_gearboxes, random_cases, seed
+        ):
+            for strategy in strategies:
+                for name, engine in engines.items():
+                    divergence = compare_engine(
+                        engine, num, target_min, target_max, top_n, strategy
+                    )
+                    if divergence:
+                        failures.append((name, divergence))
+
+    return failures
+
+
+def format_breakdown(side):
+    if side is None:
+        return ["    (no result)"]
+
+    b = side["breakdown"]
+    setup_str = ", ".join(
+        f"{'TOWARD' if o == 1 else 'AWAY'} {a}/{bb}" for o, a, bb in side["setup"]
+    )
+    lines = [f"    setup:      {setup_str}"]
+    if "reported_score" in side:
+        lines.append(f"    reported:   {side['reported_score']!r}")
+    lines += [
+        f"    score:      {b['score']!r}",
+        f"    range:      {b['range']!r}  (min {b['actual_min']:.4f}, max {b['actual_max']:.4f})",
+        f"    smoothness: {b['smoothness']!r}  (log-gap std dev {b['log_gap_std_dev']})",
+        f"    util:       {b['utilization']!r}",
+        f"    gears:      {b['main_sequence']} main / {b['unique_ratios']} unique",
+    ]
+    return lines
+
+
+def format_divergence(engine_name, divergence):
+    d = divergence
+    rank = f"rank {d['rank']}" if d["rank"] else "per-setup score"
+    lines = [
+        f"{engine_name}: {d['strategy']}, {d['gearboxes']} gearboxes, "
+        f"target {d['target_min']} - {d['target_max']}, first divergence at {rank}",
+        "  reference:",
+    ]
+    lines += format_breakdown(d["reference"])
+    lines.append("  engine:")
+    lines += format_breakdown(d["engine"])
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    max_n = int(args[0]) if len(args) > 0 else 3
+    n_random = int(args[1]) if len(args) > 1 else 20
+    case_seed = int(args[2]) if len(args) > 2 else 0
+
+    score_failures = []
+    for num in range(1, max_n + 1):
+        for target_min, target_max in FIXED_TARGETS:
+            for strategy in REFERENCE_STRATEGIES:
+                divergence = compare_score_function(
+                    solver.score_configuration, num, target_min, target_max, strategy
+                )
+                if divergence:
+                    score_failures.append(("score_configuration", divergence))
+
+    engine_failures = run_differential_suite(
+        {"find_best_configurations": solver.find_best_configurations},
+        max_n,
+        n_random,
+        case_seed,
+    )
+
+    failures = score_failures + engine_failures
+    for engine_name, divergence in failures:
+        print(format_divergence(engine_name, divergence))
+        print()
+
+    coverage = filter_max_coverage(max_n)
+    print(f"filter_max changes the reference top-5 in {coverage} fixed case(s)")
+    if coverage == 0:
+        print(f"{FILTER_MAX_STRATEGY} no longer exercises filter_max, pick another base")
+
+    print(f"{len(failures)} divergence(s)")
+    sys.exit(1 if failures or coverage == 0 else 0)
@@ -1,7 +1,14 @@
+import os
 import sys
 import re
+import select
+import threading
 import solver
 
+if os.name == "posix":
+    import termios
+    import tty
+
 # ANSI Colors
 C_RESET = "\033[0m"
 C_BOLD = "\033[1m"
@@ -14,6 +21,14 @@ C_CYAN = "\033[96m"
 C_WHITE = "\033[97m"
 C_GREY = "\033[90m"
 
+# Above this many gearboxes the exhaustive search is too slow and the
+# time-budgeted heuristic solver is used instead.
+EXHAUSTIVE_MAX_GEARBOXES = 5
+# The heuristic runs a fixed, seeded move budget (reproducible results);
+# the time budget is only a safety cap per strategy.
+HEURISTIC_SEED = 0
+HEURISTIC_TIME_BUDGET = 30.0  # seconds
+
 
 def clear_screen():
     print("\033[H\033[J", end="")
@@ -54,6 +69,22 @@ def get_int_input(prompt):
             print(f"{C_RED}Invalid input. Please enter an integer.{C_RESET}")
 
 
+def get_ratio_list_input(prompt):
+    """Comma separated list of positive ratios; empty input returns None."""
+    while True:
+        raw = input(f"{C_GREEN}{prompt}{C_RESET}").strip()
+        if not raw:
+            return None
+        try:
+            vals = [float(v) for v in raw.replace(",", " ").split()]
+            if any(v <= 0 for v in vals):
+                print(f"{C_RED}Please enter positive numbers only.{C_RESET}")
+                continue
+            return sorted(vals)
+        except ValueError:
+            print(f"{C_RED}Invalid input. Please enter numbers separated by commas.{C_RESET}")
+
+
 def format_gearbox_line(idx, gb):
     direction_str = "TOWARD (Multiply)" if gb.orientation == 1 else "AWAY (Divide)"
     color = C_CYAN if gb.orientation == 1 else C_YELLOW
@@ -77,10 +108,219 @@ def get_result_stats(result):
     return r_min, r_max, avg_step, count
 
 
-def show_comparison(all_results, target_min, target_max):
+class SolveSession:
+    """
+    Solves all strategies for one set of inputs on a background thread.
+
+    Strategies are solved in STRATEGIES order and published to `results` as
+    each one finishes (`updated` is set on every publish), so the TUI can
+    draw them right away. The detail views of each strategy's visible top 2
+    are rendered as soon as it is solved, the rest once everything is done.
+    A strategy whose solve fails is published to `errors` instead.
+    """
+
+    def __init__(self, count, target_min, target_max, target_ratios=None):
+        self.count = count
+        self.target_min = target_min
+        self.target_max = target_max
+        self.target_ratios = target_ratios
+        self.use_heuristic = count > EXHAUSTIVE_MAX_GEARBOXES
+
+        self.results = {}  # strategy -> list of results, once solved
+        self.errors = {}  # strategy -> error message, if the solve failed
+        self.updated = threading.Event()
+        self._details = {}  # (id(result), strategy, show_states) -> lines
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """Stops the worker, including a solve in progress; results are discarded."""
+        self._cancelled.set()
+
+    def snapshot(self):
+        """
+        Returns (finished results dict, list of pending strategy names,
+        errors dict).
+        """
+        with self._lock:
+            finished = dict(self.results)
+            errors = dict(self.errors)
+        pending = [
+            s for s in solver.STRATEGIES
+            if s not in finished and s not in errors and not self._skipped(s)
+        ]
+        return finished, pending, errors
+
+    def get_details_lines(self, result, strategy_name, show_states=True):
+        """Detail view lines for a result, from the cache if precomputed."""
+        key = (id(result), strategy_name, show_states)
+        with self._lock:
+            lines = self._details.get(key)
+        if lines is None:
+            lines = self._render(result, strategy_name, show_states)
+        # Callers pad the list for side-by-side view, hand out a copy
+        return list(lines)
+
+    def _render(self, result, strategy_name, show_states):
+        lines = get_details_lines(
+            result,
+            str(strategy_name),
+            show_states=show_states,
+            target_ratios=self.target_ratios,
+        )
+        with self._lock:
+            self._details[(id(result), strategy_name, show_states)] = lines
+        return lines
+
+    def _render_all(self, queue):
+        """Renders full and compact (side-by-side) views; False if cancelled."""
+        for strategy, res in queue:
+            for show_states in (True, False):
+                if self._cancelled.is_set():
+                    return False
+                self._render(res, strategy, show_states)
+        return True
+
+    def _skipped(self, strategy):
+        # No gear list given, leave gear list strategies out
+        return solver.uses_gear_list(strategy) and not self.target_ratios
+
+    def _solve(self, strategy):
+        if self._skipped(strategy):
+            return []
+
+        if self.use_heuristic:
+            return solver.find_best_configurations_heuristic(
+                self.count,
+                self.target_min,
+                self.target_max,
+                top_n=5,
+                strategy=strategy,
+                time_budget=HEURISTIC_TIME_BUDGET,
+                seed=HEURISTIC_SEED,
+                target_ratios=self.target_ratios,
+                should_stop=self._cancelled.is_set,
+            )
+        return solver.find_best_configurations(
+            self.count,
+            self.target_min,
+            self.target_max,
+            top_n=5,
+            strategy=strategy,
+            target_ratios=self.target_ratios,
+            should_stop=self._cancelled.is_set,
+        )
+
+    def _run(self):
+        for strategy in solver.STRATEGIES.keys():
+            if self._cancelled.is_set():
+                return
+            try:
+                results = self._solve(strategy)
+            except solver.SolveCancelled:
+                return
+            except Exception as e:
+                with self._lock:
+                    self.errors[strategy] = f"{type(e).__name__}: {e}"
+                self.updated.set()
+                continue
+
+            with self._lock:
+                self.results[strategy] = results
+            self.updated.set()
+
+            # The top 2 are on the comparison screen right now
+            if not self._render_all([(strategy, res) for res in results[:2]]):
+                return
+
+        queue = []
+        for strategy, results in self.results.items():
+            queue += [(strategy, res) for res in results[2:]]
+        self._render_all(queue)
+
+
+def input_until_update(prompt, updated=None, typed=""):
+    """
+    input() that gives up as soon as `updated` is set, so the caller can
+    redraw with new results.
+    Returns: (line, None) once Enter is pressed, or (None, typed) when
+             interrupted, where typed is the unfinished line to pass back in
+             after the redraw. Needs select() on stdin, so it falls back to a
+             plain input() on Windows.
+    """
+    if (updated is None and not typed) or os.name != "posix":
+        return input(prompt), None
+
+    if not sys.stdin.isatty():
+        # Piped input arrives a whole line at a time, nothing to preserve
+        print(prompt, end="", flush=True)
+        while True:
+            ready, _, _ = select.select([sys.stdin], [], [], 0.2)
+            if ready:
+                line = sys.stdin.readline()
+                if not line:
+                    raise EOFError
+                return line.rstrip("\n"), None
+            if updated is not None and updated.is_set():
+                return None, ""
+
+    # In line mode the terminal holds typed characters until Enter, so a
+    # redraw would wipe them from the screen but still submit them. Read
+    # key by key instead and keep the line ourselves.
+    fd = sys.stdin.fileno()
+    old_attrs = termios.tcgetattr(fd)
+    tty.setcbreak(fd)
+    try:
+        print(prompt + typed, end="", flush=True)
+        while True:
+            ready, _, _ = select.select([fd], [], [], 0.2)
+            if ready:
+                chunk = os.read(fd, 64).decode(errors="ignore")
+                if not chunk:
+                    raise EOFError
+                if chunk.startswith("\x1b"):
+                    # Arrow keys and other escape sequences
+                    continue
+                for char in chunk:
+                    if char in "\r\n":
+                        print()
+                        return typed, None
+                    if char in "\x7f\b":
+                        if typed:
+                            typed = typed[:-1]
+                            print("\b \b", end="", flush=True)
+                    elif char == "\x04" and not typed:
+                        raise EOFError
+                    elif char.isprintable():
+                        typed += char
+                        print(char, end="", flush=True)
+            elif updated is not None and updated.is_set():
+                return None, typed
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_attrs)
+
+
+def show_comparison(
+    all_results,
+    target_min,
+    target_max,
+    target_ratios=None,
+    pending=(),
+    errors=None,
+    updated=None,
+    typed="",
+):
     """
     Displays top 2 results from each strategy for comparison.
-    Returns: (mode, data) where mode is 'result', 'strategy_list', or 'compare'
+    Strategies in `pending` are listed as still calculating, those in
+    `errors` with their error. If `updated` (threading.Event) is set while
+    waiting for input, returns 'retry' with the unfinished input as data, to
+    be passed back as `typed` after the redraw.
+    Returns: (mode, data) where mode is 'result', 'strategy_list', 'compare',
+             'retry' (redraw) or None (restart)
              If 'result': data is (strategy_name, result)
              If 'strategy_list': data is strategy_name
              If 'compare': data is ((strategy_name1, result1), (strategy_name2, result2))
@@ -89,6 +329,8 @@ def show_comparison(all_results, target_min, target_max):
     print_header()
     print(f"{C_BOLD}{C_GREEN}Strategy Comparison (Top 2 per Strategy){C_RESET}")
     print(f"{C_GREY}Goal: {target_min} - {target_max}{C_RESET}")
+    if target_ratios:
+        print(f"{C_GREY}Gear List: {', '.join(f'{r:g}' for r in target_ratios)}{C_RESET}")
     print(f"{C_BLUE}{'=' * 60}{C_RESET}")
 
     # Store selections: mapping letter -> (strategy, result)
@@ -99,8 +341,20 @@ def show_comparison(all_results, target_min, target_max):
 
     letter_idx = ord("a")
 
+    errors = errors or {}
+
     for strategy in solver.STRATEGIES.keys():
-        results = all_results[strategy]
+        if strategy in pending or strategy in errors:
+            strategy_mappings[str(strategy_num)] = strategy
+            strategy_num += 1
+            print(f"\n{C_BOLD}{C_MAGENTA}[{strategy_num - 1}] {strategy}{C_RESET}:")
+            if strategy in errors:
+                print(f"  {C_RED}Error: {errors[strategy]}{C_RESET}")
+            else:
+                print(f"  {C_GREY}Calculating...{C_RESET}")
+            continue
+
+        results = all_results.get(strategy)
         if not results:
             continue
 
@@ -143,20 +397,25 @@ def show_comparison(all_results, target_min, target_max):
     else:
         num_help = ""
 
-    raw_input = (
-        input(
-            f"{C_GREEN}Select: [{C_CYAN}{letter_range}{C_RESET}] for details (or two for compare) {
-                num_help
-            } | [{C_CYAN}r{C_RESET}] restart: {C_RESET}"
-        )
-        .strip()
-        .lower()
+    if pending:
+        print(f"{C_GREY}{len(pending)} strategies still calculating, results appear as they finish.{C_RESET}")
+
+    raw_input, typed = input_until_update(
+        f"{C_GREEN}Select: [{C_CYAN}{letter_range}{C_RESET}] for details (or two for compare) {
+            num_help
+        } | [{C_CYAN}r{C_RESET}] restart: {C_RESET}",
+        updated if pending else None,
+        typed,
     )
+    if raw_input is None:
+        # New results came in while waiting
+        return "retry", typed
 
-    tokens = raw_input.split()
+    tokens = raw_input.strip().lower().split()
     
     if not tokens:
-        return None, None
+        # Empty input only redraws, restart is 'r'
+        return "retry", None
         
     choice = tokens[0]
 
@@ -172,12 +431,7 @@ def show_comparison(all_results, target_min, target_max):
         else:
             print(f"{C_RED}Invalid comparison selection.{C_RESET}")
             input("Press Enter...")
-            return show_comparison(all_results, target_min, target_max) # Recursive retry or just loop in main? recursion is risky but easy here. 
-            # Actually, let's just return None to loop in main, but main breaks on None. 
-            # Better to just return None, None and let main loop restart? 
-            # No, main restarts on "r". 
-            # Let's just return a "retry" signal or similar?
-            # Or simpler:
+            # Let main redraw from a fresh snapshot (strategies may have finished)
             return "retry", None
 
     elif choice in selections:
@@ -185,10 +439,13 @@ def show_comparison(all_results, target_min, target_max):
     elif choice in strategy_mappings:
         return "strategy_list", strategy_mappings[choice]
     else:
-        return None, None
+        # Unknown input just redraws, restart is 'r'
+        return "retry", None
 
 
-def get_details_lines(result, strategy_name="", width=80, show_states=True):
+def get_details_lines(
+    result, strategy_name="", width=80, show_states=True, target_ratios=None
+):
     lines = []
     lines.append("")
     lines.append(
@@ -300,6 +557,28 @@ def get_details_lines(result, strategy_name="", width=80, show_states=True):
                 }"
             )
 
+    # Target gear list matching (Gear List strategies only)
+    if (
+        target_ratios
+        and strategy_name in solver.STRATEGIES
+        and solver.uses_gear_list(strategy_name)
+    ):
+        main_ratios = [item["ratio"] for item in main_sequence]
+        gear_numbers = {r: i for i, r in enumerate(main_ratios, 1)}
+        lines.append("")
+        lines.append(f"{C_BOLD}{C_GREEN}[ Target Gear Match ]{C_RESET}")
+        lines.append(f"{C_GREY}{'Target':<8} | {'Gear':<6} | {'Ratio':<8} | {'Error'}{C_RESET}")
+        lines.append(f"{C_GREY}{'-' * 40}{C_RESET}")
+        for target, matched in solver.gear_list_assignment(target_ratios, main_ratios):
+            if matched is None:
+                lines.append(f"{target:<8.3f} | {C_RED}{'-':<6} | {'-':<8} | missing{C_RESET}")
+            else:
+                err = (matched - target) / target
+                lines.append(
+                    f"{target:<8.3f} | {gear_numbers[matched]:<6} | "
+                    f"{C_YELLOW}{matched:<8.3f}{C_RESET} | {err:+.1%}"
+                )
+
     if left_out:
         lines.append("")
         lines.append(f"{C_BOLD}{C_GREY}[ Unused / Redundant Ratios ]{C_RESET}")
@@ -358,8 +637,11 @@ def get_details_lines(result, strategy_name="", width=80, show_states=True):
     return lines
 
 
-def show_details(result, strategy_name=""):
-    lines = get_details_lines(result, strategy_name)
+def show_details(result, strategy_name="", session=None):
+    if session is not None:
+        lines = session.get_details_lines(result, strategy_name)
+    else:
+        lines = get_details_lines(result, strategy_name)
     for line in lines:
         print(line)
 
@@ -390,6 +672,7 @@ def print_side_by_side(lines_left, lines_right, width=80):
 
 
 def main():
+    session = None
     while True:
         clear_screen()
         print_header()
@@ -398,34 +681,45 @@ def main():
             target_min = get_float_input("Target Min Ratio (e.g. 0.5): ")
             target_max = get_float_input("Target Max Ratio (e.g. 3.0): ")
             count = get_int_input("Number of Gearboxes (max 4 recommended): ")
+            target_ratios = get_ratio_list_input(
+                "Target Gear List (e.g. 0.5, 0.8, 1.2, 2.0 - blank to skip): "
+            )
 
-            if count > 5:
+            use_heuristic = count > EXHAUSTIVE_MAX_GEARBOXES
+            if use_heuristic:
                 print(
-                    f"\n{
-                        C_YELLOW
-                    }Warning: >5 gearboxes may take a long time to calculate.{C_RESET}"
+                    f"\n{C_YELLOW}>{EXHAUSTIVE_MAX_GEARBOXES} gearboxes: using heuristic "
+                    f"search ({solver.heuristic_iterations(count)} moves per strategy, "
+                    f"results may not be optimal).{C_RESET}"
                 )
                 confirm = input(f"{C_GREEN}Continue? (y/n): {C_RESET}")
                 if confirm.lower() != "y":
                     continue
 
-            # Calculate for ALL strategies
-            print(
-                f"\n{C_CYAN}Calculating configurations for all strategies...{C_RESET}"
-            )
-            all_results = {}
-            for strat in solver.STRATEGIES.keys():
-                results = solver.find_best_configurations(
-                    count, target_min, target_max, top_n=5, strategy=strat
-                )
-                all_results[strat] = results
+            # Solve ALL strategies in the background, results fill in as they finish
+            session = SolveSession(count, target_min, target_max, target_ratios)
+            typed = ""
 
             # Show Comparison
             while True:
+                # Clear before the snapshot so no publish in between is missed
+                session.updated.clear()
+                all_results, pending, errors = session.snapshot()
                 mode, selection = show_comparison(
-                    all_results, target_min, target_max)
+                    all_results,
+                    target_min,
+                    target_max,
+                    target_ratios,
+                    pending,
+                    errors,
+                    session.updated,
+                    typed,
+                )
+                # Unfinished input survives a redraw
+                typed = (selection or "") if mode == "retry" else ""
 
                 if mode is None:
+                    session.cancel()
                     break  # User restarted or invalid input that implies restart/loop
                 
                 if mode == "retry":
@@ -434,7 +728,15 @@ def main():
                 if mode == "strategy_list":
                     # Direct navigation to list view via number key
                     strategy_name = selection  # type: ignore
-                    selected_results = all_results[strategy_name]
+                    if strategy_name in pending:
+                        print(f"{C_YELLOW}{strategy_name} is still calculating.{C_RESET}")
+                        input(f"\n{C_GREEN}Press Enter...{C_RESET}")
+                        continue
+                    if strategy_name in errors:
+                        print(f"{C_RED}{strategy_name} failed: {errors[strategy_name]}{C_RESET}")
+                        input(f"\n{C_GREEN}Press Enter...{C_RESET}")
+                        continue
+                    selected_results = session.snapshot()[0][strategy_name]
 
                     while True:
                         clear_screen()
@@ -481,7 +783,9 @@ def main():
                                     result = selected_results[idx - 1]
                                     clear_screen()
                                     # type: ignore
-                                    show_details(result, str(strategy_name))
+                                    show_details(
+                                        result, str(strategy_name), session
+                                    )
                                     input(f"\n{C_GREEN}Press Enter to return...{C_RESET}")
                                 else:
                                     print(f"{C_RED}Invalid ID.{C_RESET}")
@@ -494,7 +798,7 @@ def main():
                     strategy_name, result = selection  # type: ignore
                     
                     clear_screen()
-                    show_details(result, str(strategy_name))
+                    show_details(result, str(strategy_name), session)
                     input(f"\n{C_GREEN}Press Enter to return...{C_RESET}")
 
                 elif mode == "compare":
@@ -502,12 +806,14 @@ def main():
                     (strat1, res1), (strat2, res2) = selection # type: ignore
                     
                     clear_screen()
-                    lines1 = get_details_lines(res1, str(strat1), show_states=False)
-                    lines2 = get_details_lines(res2, str(strat2), show_states=False)
+                    lines1 = session.get_details_lines(res1, strat1, show_states=False)
+                    lines2 = session.get_details_lines(res2, strat2, show_states=False)
                     print_side_by_side(lines1, lines2)
                     input(f"\n{C_GREEN}Press Enter to return...{C_RESET}")
 
         except KeyboardInterrupt:
+            if session is not None:
+                session.cancel()
             print(f"\n{C_CYAN}Goodbye!{C_RESET}")
             sys.exit(0)
 
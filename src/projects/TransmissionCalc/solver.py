@@ -1,5 +1,10 @@
+import array
+import heapq
 import itertools
 import math
+import random
+import threading
+import time
 
 # Available Ratios in Stormworks
 # Display Name -> Numerical Value
@@ -17,6 +22,10 @@ RATIO_MAP = {
 VAL_TO_NAME = {v: k for k, v in RATIO_MAP.items()}
 
 
+class SolveCancelled(Exception):
+    """Raised by the solvers when their should_stop callback returns True."""
+
+
 class GearboxConfig:
     def __init__(self, orientation, ratio_a_name, ratio_b_name):
         """
@@ -91,12 +100,16 @@ def calculate_detailed_ratios(gearboxes):
 
 def calculate_transmission_ratios(gearboxes):
     """
-    Legacy wrapper for scoring: returns sorted unique floats.
+    Scoring helper: returns sorted unique floats.
+    Same products as calculate_detailed_ratios (multiplied in gearbox order
+    from 1.0), without building a dict per state.
     """
-    details = calculate_detailed_ratios(gearboxes)
-    # Extract unique ratios
-    unique = set(d["ratio"] for d in details)
-    return sorted(list(unique))
+    ratios = [1.0]
+    for gb in gearboxes:
+        off_val = gb.get_ratio_val(False)
+        on_val = gb.get_ratio_val(True)
+        ratios = [r * v for r in ratios for v in (off_val, on_val)]
+    return sorted(set(ratios))
 
 
 def filter_main_sequence(ratios):
@@ -121,33 +134,187 @@ STRATEGIES = {
         "range": 5.0,
         "smoothness": 0.5,
         "utilization": 10.0,
+        "gear_list": 0.0,
         "filter_max": False,
     },
     "Range First": {
         "range": 10.0,
         "smoothness": 0.1,
         "utilization": 0.5,
+        "gear_list": 0.0,
         "filter_max": False,
     },
     "Smoothness First": {
         "range": 2.0,
         "smoothness": 5.0,
         "utilization": 0.5,
+        "gear_list": 0.0,
         "filter_max": False,
     },
     "Quality Over Quantity": {
         "range": 10.0,
         "smoothness": 10.0,
         "utilization": 0.5,
+        "gear_list": 0.0,
+        "filter_max": False,
+    },
+    # Needs an explicit list of target ratios (target_ratios). Ranks purely
+    # by match quality; the gear list lower bound still prunes the search.
+    "Gear List Match": {
+        "range": 0.0,
+        "smoothness": 0.0,
+        "utilization": 0.0,
+        "gear_list": 10.0,
         "filter_max": False,
     },
 }
 
+# Log-error charged for a target gear that has no gear left to match it
+# (log(2): as bad as being off by a factor of two)
+GEAR_LIST_MISSING_PENALTY = math.log(2.0)
+
+
+def uses_gear_list(strategy):
+    """True if the strategy scores against a target gear list."""
+    return STRATEGIES[strategy]["gear_list"] > 0
+
+
+def _gear_list_row(prev, t, main_logs):
+    """
+    One DP row of the gear list assignment: given prev[j], the best cost for
+    the earlier targets using the first j gears, returns the same for target
+    t added. Shared by gear_list_error and gear_list_assignment so the
+    backtracking sees exactly the values the score was computed from.
+    """
+    missing = GEAR_LIST_MISSING_PENALTY
+    # Best of "target unmatched" and "target matched to gear j" per column
+    step = [
+        min(unmatched + missing, matched + abs(t - g))
+        for unmatched, matched, g in zip(prev[1:], prev, main_logs)
+    ]
+    # "Gear j left spare" carries the previous column over: a running min
+    return list(itertools.accumulate(step, min, initial=prev[0] + missing))
+
+
+def gear_list_error(target_logs, main_logs, limit=None):
+    """
+    Optimal order-preserving assignment error between sorted target ratios
+    and a sorted main sequence, both given as natural logs.
+
+    Each target is matched to at most one gear and matches never cross.
+    A matched target costs |log(target) - log(gear)|, an unmatched one
+    GEAR_LIST_MISSING_PENALTY. Spare gears are free.
+    O(len(targets) * len(gears)) DP over a single rolling row.
+
+    Costs only grow from row to row, so once a whole row is above `limit`
+    the result will be too and inf is returned early.
+    """
+    row = [0.0] * (len(main_logs) + 1)
+    for t in target_logs:
+        row = _gear_list_row(row, t, main_logs)
+        if limit is not None and min(row) > limit:
+            return float("inf")
+    return row[-1]
+
+
+def gear_list_assignment(target_ratios, main_ratios):
+    """
+    Same DP as gear_list_error, but keeps every row and backtracks to return
+    the assignment for display: a list of (target, matched_ratio or None)
+    in target order.
+    """
+    targets = sorted(target_ratios)
+    target_logs = [math.log(t) for t in targets]
+    main_logs = [math.log(r) for r in main_ratios]
+
+    rows = [[0.0] * (len(main_logs) + 1)]
+    for t in target_logs:
+        rows.append(_gear_list_row(rows[-1], t, main_logs))
+
+    # Backtrack, recomputing each candidate with the same expression as
+    # _gear_list_row so the equality checks are exact
+    pairs = []
+    i, j = len(targets), len(main_logs)
+    while i > 0:
+        if j > 0 and rows[i][j] == rows[i][j - 1]:
+            j -= 1
+        elif j > 0 and rows[i][j] == rows[i - 1][j - 1] + abs(
+            target_logs[i - 1] - main_logs[j - 1]
+        ):
+            pairs.append((targets[i - 1], main_ratios[j - 1]))
+            i -= 1
+            j -= 1
+        else:
+            pairs.append((targets[i - 1], None))
+            i -= 1
+    pairs.reverse()
+    return pairs
+
+
+def gear_list_lower_bound(target_logs, log_min, log_max):
+    """
+    Lower bound of gear_list_error for any setup whose ratios lie within
+    [exp(log_min), exp(log_max)]: targets outside that span cost at least
+    their distance to it.
+    """
+    bound = 0.0
+    for t in target_logs:
+        if t < log_min:
+            bound += min(log_min - t, GEAR_LIST_MISSING_PENALTY)
+        elif t > log_max:
+            bound += min(t - log_max, GEAR_LIST_MISSING_PENALTY)
+    return bound
+
+
+def range_penalty(actual_min, actual_max, target_min, target_max, weight):
+    """
+    Range term of score_configuration. Shared with RangeIndex so the index
+    lower bound is bit-identical to the real range term.
+    """
+    min_error = abs(actual_min - target_min) / target_min
+    max_error = abs(actual_max - target_max) / target_max
+
+    raw_range_score = (min_error * 100) + (max_error * 100)
+    return raw_range_score * weight
+
 
-def score_configuration(gearboxes, target_min, target_max, strategy="Balanced"):
+def score_configuration(
+    gearboxes, target_min, target_max, strategy="Balanced", target_ratios=None
+):
     """
     Scores a setup based on strategy weights.
     Lower score is better.
+    target_ratios (list of desired gear ratios) is required by gear list
+    strategies and ignored by the others.
+    """
+    return _score_setup(
+        gearboxes,
+        target_min,
+        target_max,
+        strategy,
+        _target_logs(strategy, target_ratios),
+    )
+
+
+def _target_logs(strategy, target_ratios):
+    """
+    Sorted target ratios as natural logs for gear list strategies, None for
+    the others. Solvers compute this once per solve, not per setup.
+    """
+    if not STRATEGIES[strategy]["gear_list"]:
+        return None
+    if not target_ratios:
+        raise ValueError(f"Strategy '{strategy}' requires target_ratios")
+    return [math.log(t) for t in sorted(target_ratios)]
+
+
+def _score_setup(
+    gearboxes, target_min, target_max, strategy, target_logs, threshold=None
+):
+    """
+    score_configuration with the target gear list already in log form.
+    With a threshold, setups whose score would exceed it may come back as
+    inf without finishing the gear list DP.
     """
     weights = STRATEGIES[strategy]
 
@@ -161,12 +328,9 @@ def score_configuration(gearboxes, target_min, target_max, strategy="Balanced"):
     actual_min = ratios[0]
     actual_max = ratios[-1]
 
-    # Range Penalty:
-    min_error = abs(actual_min - target_min) / target_min
-    max_error = abs(actual_max - target_max) / target_max
-
-    raw_range_score = (min_error * 100) + (max_error * 100)
-    range_score = raw_range_score * weights["range"]
+    range_score = range_penalty(
+        actual_min, actual_max, target_min, target_max, weights["range"]
+    )
 
     # Smoothness & Utilization:
     if len(main_ratios) > 1:
@@ -194,56 +358,432 @@ def score_configuration(gearboxes, target_min, target_max, strategy="Balanced"):
         utilization_score = 500.0 * weights["utilization"]
 
     total_score = range_score + smoothness_score + utilization_score
+
+    # Gear List Penalty:
+    if weights["gear_list"]:
+        if len(main_ratios) > 1:
+            main_logs = log_ratios
+        else:
+            main_logs = [math.log(r) for r in main_ratios]
+        limit = None
+        if threshold is not None and threshold != float("inf"):
+            # Slack so float rounding never cuts off a setup at the threshold
+            limit = (threshold - total_score) / (weights["gear_list"] * 100)
+            limit = limit * (1 + 1e-9) + 1e-12
+        raw_gear_list_score = gear_list_error(target_logs, main_logs, limit) * 100
+        total_score += raw_gear_list_score * weights["gear_list"]
+
     return total_score, ratios
 
 
+class RangeIndex:
+    """
+    All setups of one gearbox count, bucketed by their exact achievable
+    (min, max) ratio.
+
+    A setup's min/max is just the product of each gearbox's low/high ratio,
+    so it is known without expanding all 2^N states. Many setups share the
+    same pair, so a query only has to rank the (few) buckets by range error.
+    """
+
+    def __init__(self, num_gearboxes, should_stop=None):
+        self.num_gearboxes = num_gearboxes
+        self.options = generate_gearbox_options()
+        self.num_options = len(self.options)
+
+        lows = [min(gb.get_ratio_val(False), gb.get_ratio_val(True))
+                for gb in self.options]
+        highs = [max(gb.get_ratio_val(False), gb.get_ratio_val(True))
+                 for gb in self.options]
+
+        # (actual_min, actual_max) -> array of setup codes. A code packs the
+        # option indices in base num_options, most significant first, so
+        # numeric order equals combinations_with_replacement order.
+        self.buckets = {}
+        for n, key in enumerate(itertools.combinations_with_replacement(
+            range(self.num_options), num_gearboxes
+        )):
+            if should_stop is not None and n % 4096 == 0 and should_stop():
+                raise SolveCancelled()
+            # Same multiplication order as calculate_detailed_ratios, so the
+            # products equal ratios[0] / ratios[-1] exactly.
+            actual_min = 1.0
+            actual_max = 1.0
+            code = 0
+            for i in key:
+                actual_min *= lows[i]
+                actual_max *= highs[i]
+                code = code * self.num_options + i
+
+            bucket = self.buckets.get((actual_min, actual_max))
+            if bucket is None:
+                bucket = self.buckets[(actual_min, actual_max)] = array.array("Q")
+            bucket.append(code)
+
+    def decode(self, code):
+        """Returns the setup (tuple of GearboxConfig) for a setup code."""
+        indices = []
+        for _ in range(self.num_gearboxes):
+            code, i = divmod(code, self.num_options)
+            indices.append(i)
+        return tuple(self.options[i] for i in reversed(indices))
+
+    def by_lower_bound(self, bound):
+        """
+        Returns (bound(actual_min, actual_max), codes) per bucket, sorted by
+        increasing bound.
+        """
+        scored = [(bound(mn, mx), codes) for (mn, mx), codes in self.buckets.items()]
+        scored.sort(key=lambda x: x[0])
+        return scored
+
+
+_RANGE_INDEXES = {}
+_RANGE_INDEX_LOCK = threading.Lock()
+
+
+def get_range_index(num_gearboxes, should_stop=None):
+    """
+    Builds the RangeIndex for a gearbox count once and caches it.
+    Callers wait for a build already in progress instead of starting their
+    own. A cancelled build raises SolveCancelled and caches nothing, so the
+    next caller builds it again.
+    """
+    with _RANGE_INDEX_LOCK:
+        index = _RANGE_INDEXES.get(num_gearboxes)
+        if index is None:
+            index = RangeIndex(num_gearboxes, should_stop)
+            _RANGE_INDEXES[num_gearboxes] = index
+    return index
+
+
 def find_best_configurations(
-    num_gearboxes, target_min, target_max, top_n=5, strategy="Balanced"
+    num_gearboxes,
+    target_min,
+    target_max,
+    top_n=5,
+    strategy="Balanced",
+    target_ratios=None,
+    should_stop=None,
 ):
     """
     Main solver function.
+
+    Visits setups bucket by bucket in order of increasing range error and
+    stops once the range term alone (plus the gear list bound, for gear
+    list strategies) is worse than the current top_n threshold. The other
+    terms are never negative, so this returns exactly what a full
+    enumeration would.
+
+    should_stop (optional callable) is polled for every setup; when it
+    returns True the search raises SolveCancelled.
     """
-    possible_gearboxes = generate_gearbox_options()
+    index = get_range_index(num_gearboxes, should_stop)
     strategy_config = STRATEGIES[strategy]
 
-    best_results = []
+    target_logs = _target_logs(strategy, target_ratios)
 
-    iterator = itertools.combinations_with_replacement(
-        possible_gearboxes, num_gearboxes
-    )
+    if target_logs is not None:
+        # The DP sums in a different order than the bound, so leave a
+        # little slack for float rounding
+        gear_list_weight = strategy_config["gear_list"] * 100 * (1 - 1e-9)
 
-    for gear_setup in iterator:
-        score, resulting_ratios = score_configuration(
-            gear_setup, target_min, target_max, strategy
-        )
+        def bound(mn, mx):
+            return range_penalty(
+                mn, mx, target_min, target_max, strategy_config["range"]
+            ) + gear_list_weight * gear_list_lower_bound(
+                target_logs, math.log(mn), math.log(mx)
+            )
+    else:
 
-        # Filter: Max Gears Only?
-        if strategy_config["filter_max"]:
-            # Check if we have 2^N unique ratios
-            if len(resulting_ratios) < (2**num_gearboxes):
+        def bound(mn, mx):
+            return range_penalty(
+                mn, mx, target_min, target_max, strategy_config["range"]
+            )
+
+    # round(score, 4) -> (score, code, result). rank_results only ever picks
+    # the first entry per rounded score in (score, enumeration) order, so
+    # keeping just that one is exact and stops ties from piling up.
+    best_by_rounded = {}
+    threshold = float("inf")
+
+    for lower_bound, codes in index.by_lower_bound(bound):
+        if lower_bound > threshold:
+            break
+
+        for code in codes:
+            if should_stop is not None and should_stop():
+                raise SolveCancelled()
+            gear_setup = index.decode(code)
+            score, resulting_ratios = _score_setup(
+                gear_setup, target_min, target_max, strategy, target_logs, threshold
+            )
+
+            # Filter: Max Gears Only?
+            if strategy_config["filter_max"]:
+                # Check if we have 2^N unique ratios
+                if len(resulting_ratios) < (2**num_gearboxes):
+                    continue
+
+            if score > threshold:
                 continue
 
-        best_results.append(
-            {"score": score, "setup": gear_setup, "ratios": resulting_ratios}
-        )
+            rounded_score = round(score, 4)
+            current = best_by_rounded.get(rounded_score)
+            if current is None or (score, code) < (current[0], current[1]):
+                best_by_rounded[rounded_score] = (
+                    score, code,
+                    {"score": score, "setup": gear_setup, "ratios": resulting_ratios},
+                )
+
+        if len(best_by_rounded) >= top_n:
+            threshold = heapq.nsmallest(
+                top_n, (c[0] for c in best_by_rounded.values())
+            )[-1]
+            # Anything above the threshold can never make it into the top_n
+            best_by_rounded = {
+                k: c for k, c in best_by_rounded.items() if c[0] <= threshold
+            }
 
+    candidates = sorted(best_by_rounded.values(), key=lambda x: (x[0], x[1]))
+    return rank_results([c[2] for c in candidates], top_n)
+
+
+def rank_results(results, top_n):
+    """
+    Sorts scored results (ascending) and keeps the top_n with distinct scores.
+    """
     # Sort by score (ascending)
-    best_results.sort(key=lambda x: x["score"])
+    results.sort(key=lambda x: x["score"])
 
     # Filter for distinct scores
     unique_results = []
     seen_scores = set()
 
-    for res in best_results:
+    for res in results:
         # Round score to avoid float precision issues hiding duplicates
         # 4 decimal places should be sufficient differentiation
         rounded_score = round(res["score"], 4)
-        
+
         if rounded_score not in seen_scores:
             seen_scores.add(rounded_score)
             unique_results.append(res)
-            
+
             if len(unique_results) >= top_n:
                 break
 
     return unique_results
+
+
+# Heuristic move budget. Scoring a setup expands 2^N states, each costing
+# roughly O(N) (product, set insert, sort), so moves are scaled by
+# 1 / (N * 2^N). Measured at about 1-2 seconds per strategy for 6-12
+# gearboxes.
+HEURISTIC_WORK_BUDGET = 12_000_000
+HEURISTIC_MIN_ITERATIONS = 200
+
+
+def heuristic_iterations(num_gearboxes):
+    """Deterministic default move budget for the heuristic solver."""
+    return max(
+        HEURISTIC_MIN_ITERATIONS,
+        HEURISTIC_WORK_BUDGET // (num_gearboxes * 2**num_gearboxes),
+    )
+
+
+def find_best_configurations_heuristic(
+    num_gearboxes,
+    target_min,
+    target_max,
+    top_n=5,
+    strategy="Balanced",
+    time_budget=30.0,
+    seed=0,
+    max_iterations=None,
+    target_ratios=None,
+    should_stop=None,
+):
+    """
+    Anytime solver for gearbox counts too large to enumerate.
+
+    Runs simulated annealing with random restarts over setups, scored with
+    score_configuration. Returns the best-so-far top_n (same filtering and
+    distinct-score rules as find_best_configurations) once max_iterations
+    moves (default: heuristic_iterations(num_gearboxes)) have been spent.
+
+    The walk is driven by random.Random(seed), so a given seed and move
+    budget always give the same result regardless of machine speed.
+    time_budget (seconds) is only a safety cap; if it cuts the walk short
+    the result is whatever was found so far and no longer reproducible.
+
+    should_stop (optional callable) is polled every move; when it returns
+    True the search raises SolveCancelled.
+    """
+    possible_gearboxes = generate_gearbox_options()
+    num_options = len(possible_gearboxes)
+    strategy_config = STRATEGIES[strategy]
+    rng = random.Random(seed)
+    target_logs = _target_logs(strategy, target_ratios)
+    if max_iterations is None:
+        max_iterations = heuristic_iterations(num_gearboxes)
+
+    # Setups are kept as sorted tuples of option indices, which matches the
+    # combinations_with_replacement ordering used by the exhaustive solver.
+    evaluated = {}
+
+    def evaluate(key):
+        if key not in evaluated:
+            gear_setup = tuple(possible_gearboxes[i] for i in key)
+            score, resulting_ratios = _score_setup(
+                gear_setup, target_min, target_max, strategy, target_logs
+            )
+            evaluated[key] = {
+                "score": score,
+                "setup": gear_setup,
+                "ratios": resulting_ratios,
+            }
+        return evaluated[key]["score"]
+
+    def random_setup():
+        return tuple(sorted(rng.randrange(num_options) for _ in range(num_gearboxes)))
+
+    def neighbour(key):
+        setup = list(key)
+        setup[rng.randrange(num_gearboxes)] = rng.randrange(num_options)
+        return tuple(sorted(setup))
+
+    # Small spaces get fully visited long before the budget runs out
+    space_size = math.comb(num_options + num_gearboxes - 1, num_gearboxes)
+    deadline = time.perf_counter() + time_budget
+    iteration = 0
+
+    # Restart after this many moves without improving the current run's best
+    restart_after = 200 * num_gearboxes
+    start_temp = 50.0
+    cooling = 0.995
+
+    current = random_setup()
+    current_score = evaluate(current)
+    run_best = current_score
+    stale = 0
+    temp = start_temp
+
+    while time.perf_counter() < deadline:
+        if iteration >= max_iterations:
+            break
+        if len(evaluated) >= space_size:
+            break
+        if should_stop is not None and should_stop():
+            raise SolveCancelled()
+        iteration += 1
+
+        candidate = neighbour(current)
+        candidate_score = evaluate(candidate)
+        delta = candidate_score - current_score
+
+        if delta <= 0 or rng.random() < math.exp(-delta / temp):
+            current, current_score = candidate, candidate_score
+
+        if current_score < run_best:
+            run_best = current_score
+            stale = 0
+        else:
+            stale += 1
+
+        temp = max(temp * cooling, 1e-3)
+
+        if stale >= restart_after:
+            current = random_setup()
+            current_score = evaluate(current)
+            run_best = current_score
+            stale = 0
+            temp = start_temp
+
+    best_results = []
+    # Visit keys in enumeration order so equal scores resolve the same way
+    # as in the exhaustive solver.
+    for key in sorted(evaluated):
+        res = evaluated[key]
+        # Filter: Max Gears Only?
+        if strategy_config["filter_max"]:
+            if len(res["ratios"]) < (2**num_gearboxes):
+                continue
+        best_results.append(res)
+
+    return rank_results(best_results, top_n)
+
+
+def heuristic_gap_report(
+    target_min,
+    target_max,
+    max_gearboxes=5,
+    strategy="Balanced",
+    time_budget=30.0,
+    seed=0,
+):
+    """
+    Compares the heuristic solver against the exhaustive optimum for
+    1..max_gearboxes gearboxes.
+
+    The heuristic runs with its default deterministic move budget, so the
+    report is reproducible for a given seed.
+
+    Returns a list of dicts per gearbox count with the best score found by
+    each solver, the relative gap and how many of the exhaustive top 5
+    scores the heuristic also found.
+    """
+    report = []
+    for num in range(1, max_gearboxes + 1):
+        start = time.perf_counter()
+        exact = find_best_configurations(num, target_min, target_max, 5, strategy)
+        exact_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx = find_best_configurations_heuristic(
+            num, target_min, target_max, 5, strategy, time_budget, seed
+        )
+        approx_time = time.perf_counter() - start
+
+        if not exact or not approx:
+            report.append({"gearboxes": num, "exact": None, "heuristic": None})
+            continue
+
+        exact_best = exact[0]["score"]
+        approx_best = approx[0]["score"]
+        exact_scores = set(round(r["score"], 4) for r in exact)
+        approx_scores = set(round(r["score"], 4) for r in approx)
+
+        report.append(
+            {
+                "gearboxes": num,
+                "exact": exact_best,
+                "heuristic": approx_best,
+                "gap": (approx_best - exact_best) / exact_best if exact_best else 0.0,
+                "top_n_hits": len(exact_scores & approx_scores),
+                "exact_time": exact_time,
+                "heuristic_time": approx_time,
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    # Heuristic vs exhaustive comparison, e.g. `python solver.py 0.5 3.0 5`
+    import sys
+
+    args = sys.argv[1:]
+    report_min = float(args[0]) if len(args) > 0 else 0.5
+    report_max = float(args[1]) if len(args) > 1 else 3.0
+    report_n = int(args[2]) if len(args) > 2 else 5
+
+    print(f"{'N':<3} | {'Exhaustive':<11} | {'Heuristic':<11} | {'Gap':<8} | "
+          f"{'Top-5 hits':<10} | {'Time (exh/heur)'}")
+    for row in heuristic_gap_report(report_min, report_max, report_n):
+        if row["exact"] is None:
+            print(f"{row['gearboxes']:<3} | no results")
+            continue
+        print(
+            f"{row['gearboxes']:<3} | {row['exact']:<11.4f} | {row['heuristic']:<11.4f} | "
+            f"{row['gap']:<8.2%} | {row['top_n_hits']:<10} | "
+            f"{row['exact_time']:.1f}s / {row['heuristic_time']:.1f}s"
+        )